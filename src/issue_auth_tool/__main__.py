@@ -1,16 +1,23 @@
 import re
 import shlex
+import sqlite3
+import time
+from collections import Counter
 from contextlib import suppress
-from json import dumps, loads
+from functools import cache
+from hashlib import blake2b
+from itertools import batched
 from json.decoder import JSONDecodeError
 from pathlib import Path
 from queue import Queue
-from threading import Thread
-from typing import Callable, Iterable, Iterator, cast
+from threading import Lock, Thread
+from typing import Callable, Iterable, Iterator, TypeVar, cast
 
+from diskcache import Cache
 from github import Auth, Github
 from jsonschema import ValidationError
 from openai import OpenAI
+from orjson import OPT_INDENT_2, dumps, loads
 from rich.prompt import Prompt
 
 from . import logger
@@ -24,56 +31,65 @@ from .types import (
 )
 from .utils.util import SCHEMA, edit_json, rate_limit, validate
 
-g = Github(auth=Auth.Token(config["secret"]["GITHUB_TOKEN"]))
-repo = g.get_repo(f"{config['secret']['OWNER']}/{config['secret']['REPO_NAME']}")
 logger.debug(
     "已加载配置: owner=%s repo=%s llm_model=%s",
     config["secret"]["OWNER"],
     config["secret"]["REPO_NAME"],
     config["secret"]["llm"]["model"],
 )
-client = OpenAI(
-    api_key=config["secret"]["llm"]["key"], base_url=config["secret"]["llm"]["server"]
-)
 setting = config["settings"]
 all_valid_reports: dict[PostKey, ValidReport] = {}
 processed_report_keys: set[PostKey] = set()
 
+
+# GitHub / LLM 客户端在首次使用时才创建，导入模块时不访问网络
+@cache
+def get_repo():
+    # 每页取最大值 100（默认 30），减少 issue / discussion 分页请求次数
+    g = Github(auth=Auth.Token(config["secret"]["GITHUB_TOKEN"]), per_page=100)
+    return g.get_repo(f"{config['secret']['OWNER']}/{config['secret']['REPO_NAME']}")
+
+
+@cache
+def get_client() -> OpenAI:
+    return OpenAI(
+        api_key=config["secret"]["llm"]["key"],
+        base_url=config["secret"]["llm"]["server"],
+    )
+
+
 MARKDOWN_CLEANER = re.compile(
     r"""
-          (```[\s\S]*?```|~~~[\s\S]*?~~~)   #  匹配代碼塊 (Block Code)
-        | (!\[.*?\]\(.*?\))                 #  匹配圖片 (Images)
-        | (\[(?P<link_text>[^\]]+)\]\([^)]+\)) #  匹配鏈接 (Links)，捕獲組名為 link_text
-        | (\*\*|__)(?P<bold_text>.*?)       #  匹配加粗 (Bold)
-        | (\*|_)(?P<italic_text>.*?)        #  匹配斜體 (Italic)
-        | (^\s*\#+\s*)                      #  匹配標題符號 (Headers)
-        | (^\s*>\s?)                        #  匹配引用符號 (Blockquotes)
-        | (^\s*-{3,}\s*$)                   #  匹配水平線 (HR)
+          (?P<code>```[\s\S]*?```|~~~[\s\S]*?~~~)      #  匹配代碼塊 (Block Code)
+        | (?P<image>!\[.*?\]\(.*?\))                    #  匹配圖片 (Images)
+        | (?P<link>\[(?P<link_text>[^\]]+)\]\([^)]+\))   #  匹配鏈接 (Links)，保留 link_text
+        | (?P<emphasis>\*\*|__|\*|_)                    #  匹配加粗/斜體標記 (Bold / Italic)
+        | (?P<header>^\s*\#+\s*)                        #  匹配標題符號 (Headers)
+        | (?P<quote>^\s*>\s?)                           #  匹配引用符號 (Blockquotes)
+        | (?P<hr>^\s*-{3,}\s*$)                         #  匹配水平線 (HR)
     """,
     re.VERBOSE | re.MULTILINE,
 )
+BLANK_LINES = re.compile(r"\n\s*\n")
 
 
-def strip_markdown(md):
+def _replace_markdown(match: re.Match[str]) -> str:
+    # 只有鏈接保留文字，其他匹配項（代碼塊、圖片、標記符號等）直接刪除
+    if match.lastgroup == "link":
+        return match.group("link_text")
+    return ""
+
 
-    # 定義替換邏輯的函數
-    def replace_func(match):
-        # 提取鏈接文字、加粗文字或斜體文字
-        if match.group("link_text"):
-            return match.group("link_text")
-        if match.group("bold_text"):
-            return match.group("bold_text")
-        if match.group("italic_text"):
-            return match.group("italic_text")
-        # 其他匹配項（如代碼塊、圖片、標題號）直接刪除
-        return ""
-
-    text = MARKDOWN_CLEANER.sub(replace_func, md)
-
-    text = re.sub(r"\n\s*\n", "\n", text)
+def strip_markdown(md):
+    # 單次掃描處理所有 Markdown 結構，再合併空行
+    text = MARKDOWN_CLEANER.sub(_replace_markdown, md)
+    text = BLANK_LINES.sub("\n", text)
     return text.strip()
 
 
+DISCUSSION_TEXT_LIMIT = 1024
+
+
 def get_post_key(post: PostData) -> PostKey:
     return f"{post.get('source', 'unknown')}-{post['num']}"
 
@@ -97,6 +113,7 @@ def fetch_issues_and_discussions(
     ignore: set[PostKey] = set(ignore_keys)
     logger.warning(f"忽略以下编号： {ignore}")
     strip = strip_markdown
+    repo = get_repo()
     repo_issues = repo.get_issues
     repo_discussions = repo.get_discussions
 
@@ -121,10 +138,12 @@ def fetch_issues_and_discussions(
         ):
             if f"discussions-{disc.number}" in ignore:
                 continue
+            # 先截取原文（留出 Markdown 符号被删除的余量）再清理，避免处理用不到的正文
+            body = (disc.body or "(无内容)")[: DISCUSSION_TEXT_LIMIT * 2]
             yield {
                 "title": disc.title,
                 "num": disc.number,
-                "text": strip(disc.body or "(无内容)")[:1024],
+                "text": strip(body)[:DISCUSSION_TEXT_LIMIT],
                 "source": "discussions",
             }
 
@@ -216,38 +235,213 @@ CONTENT = """
 内容：{text}
 """
 
+BATCH_INSTRUCTION = """
+
+批量模式（覆盖上文的输出要求）
+输入包含多个帖子，用 "---" 分隔。忽略上文"仅返回一个单行 JSON 对象"的要求，改为返回一个单行 JSON 数组，
+数组中每个帖子对应一个上述格式的对象，并在对象中额外加入 "num" 字段，值为该帖子的编号（整数），例如：
+[{"num":123,"type":"invalid","reason":"...","mcp":[]},{"num":124,"type":"evil","reason":"...","mcp":["view 1"]}]
+- 每个帖子都必须出现在数组中，且只出现一次。
+- 上文"无法判断时返回 {...}"的兜底规则改为：在数组中为该帖子返回 {"num":<编号>,"type":"invalid","reason":"uncertain","mcp":[]}。
+- 即使只有一个帖子，也要返回数组。
+"""
+
+
+@cache
+def get_llm_cache() -> Cache:
+    return Cache(db_path / ".llm-cache")
+
+
+def llm_cache_key(instructions: str, input: str) -> str:
+    model = config["secret"]["llm"]["model"]
+    return blake2b("\0".join((model, instructions, input)).encode()).hexdigest()
+
+
+def matches_schema(schema: dict) -> Callable[[str], bool]:
+    def accept(ret_text: str) -> bool:
+        try:
+            validate(instance=loads(ret_text), schema=schema)
+        except (JSONDecodeError, ValidationError):
+            return False
+        return True
+
+    return accept
+
+
+def get_llm_response(
+    instructions: str, input: str, *, accept: Callable[[str], bool] | None = None
+) -> str:
+    """
+    按 (模型, 提示词, 输入) 缓存到磁盘；命中时不请求 LLM，也不占用限速额度。
+    只有通过 accept 检查（如符合 schema）的回复才会写入或取自缓存，
+    未提供 accept 时不使用缓存，避免把无效输出固化下来。
+    """
+    if accept is None:
+        return request_llm_response(instructions, input)
+
+    key = llm_cache_key(instructions, input)
+    llm_cache = get_llm_cache()
+    ret = llm_cache.get(key)
+    if ret is not None and accept(ret):
+        logger.debug("LLM 缓存命中: %s", key)
+        return ret
+
+    ret = request_llm_response(instructions, input)
+    if accept(ret):
+        llm_cache[key] = ret
+    return ret
+
+
+def llm_extra_body(model: str) -> dict:
+    # qwen 系列需显式关闭思考模式
+    if model.startswith("qwen"):
+        return {"enable_thinking": False}
+    return {}
+
 
 @rate_limit(setting["rate_per_minute"], 60)
-def get_llm_response(instructions: str, input: str) -> str:
+def request_llm_response(instructions: str, input: str) -> str:
     model = config["secret"]["llm"]["model"]
     extra: dict = {}
-    if model.startswith("qwen"):
-        extra["extra_body"] = {"enable_thinking": False}
-    ret = (
-        client.chat.completions.create(
-            model=model,
-            messages=[
-                {"role": "system", "content": instructions},
-                {"role": "user", "content": input},
-            ],
-            **extra,
-        )
-        .choices[0]
-        .message.content
+    if extra_body := llm_extra_body(model):
+        extra["extra_body"] = extra_body
+    stream = get_client().chat.completions.create(
+        model=model,
+        messages=[
+            {"role": "system", "content": instructions},
+            {"role": "user", "content": input},
+        ],
+        stream=True,
+        **extra,
     )
-    if ret is not None:
-        return ret
+    # 流式接收，边生成边拼接；部分服务端会发送不含 choices 的分片（如 usage）
+    parts = [
+        chunk.choices[0].delta.content
+        for chunk in stream
+        if chunk.choices and chunk.choices[0].delta.content is not None
+    ]
+    if parts:
+        return "".join(parts)
     else:
         raise ValueError
 
 
+BATCH_API_POLL_SECONDS = 30
+BATCH_API_MAX_RETRIES = 5
+BATCH_API_FINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def submit_batch_api_requests(requests: dict[str, tuple[str, str]]) -> str:
+    """
+    上传 (instructions, input) 并创建 Batch API 任务，返回任务 ID。
+    服务端不支持 Batch API 时在此抛出异常，此时尚未产生任何费用。
+    """
+    model = config["secret"]["llm"]["model"]
+    lines = [
+        dumps(
+            {
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": {
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": instructions},
+                        {"role": "user", "content": input},
+                    ],
+                    **llm_extra_body(model),
+                },
+            }
+        )
+        for custom_id, (instructions, input) in requests.items()
+    ]
+    client = get_client()
+    input_file = client.files.create(
+        file=("requests.jsonl", b"\n".join(lines)), purpose="batch"
+    )
+    batch = client.batches.create(
+        input_file_id=input_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+    )
+    logger.info("已提交 Batch API 任务 %s，共 %s 个请求。", batch.id, len(lines))
+    return batch.id
+
+
+T = TypeVar("T")
+
+
+def retry_batch_api_call(batch_id: str, func: Callable[[], T]) -> T:
+    """任务已提交后，轮询和下载中的瞬时错误只退避重试，不轻易放弃已计费的任务。"""
+    for attempt in range(1, BATCH_API_MAX_RETRIES):
+        try:
+            return func()
+        except Exception as exc:
+            logger.warning(
+                "Batch API 任务 %s 请求失败（第 %s 次），稍后重试: %s",
+                batch_id,
+                attempt,
+                exc,
+            )
+            time.sleep(BATCH_API_POLL_SECONDS * attempt)
+    return func()
+
+
+def wait_batch_api_responses(batch_id: str) -> dict[str, str]:
+    """
+    阻塞轮询 Batch API 任务直至结束，返回 custom_id → 回复文本。
+    过期或取消的任务也会读取已完成的部分结果；失败或缺失的请求不在结果中。
+    多次重试仍出错时取消任务并返回空结果，避免与实时请求重复计费。
+    """
+    client = get_client()
+    try:
+        while True:
+            time.sleep(BATCH_API_POLL_SECONDS)
+            batch = retry_batch_api_call(
+                batch_id, lambda: client.batches.retrieve(batch_id)
+            )
+            logger.debug("Batch API 任务 %s 状态: %s", batch_id, batch.status)
+            if batch.status in BATCH_API_FINAL_STATUSES:
+                break
+        if batch.status != "completed":
+            logger.error(
+                "Batch API 任务 %s 结束于状态 %s，仅使用已完成的结果。",
+                batch_id,
+                batch.status,
+            )
+        output_file_id = batch.output_file_id
+        if output_file_id is None:
+            return {}
+        output = retry_batch_api_call(
+            batch_id, lambda: client.files.content(output_file_id).text
+        )
+    except Exception as exc:
+        logger.error("Batch API 任务 %s 多次请求失败，已取消: %s", batch_id, exc)
+        with suppress(Exception):
+            client.batches.cancel(batch_id)
+        return {}
+
+    responses: dict[str, str] = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        record = loads(line)
+        response = record.get("response") or {}
+        if response.get("status_code") != 200:
+            continue
+        content = response["body"]["choices"][0]["message"]["content"]
+        if content is not None:
+            responses[record["custom_id"]] = content
+    return responses
+
+
 db_path = Path(__file__).parent.parent / "database"
 
 
 def build_editable_text(ret_text: str) -> str:
 
     try:
-        return dumps(loads(ret_text), indent=2, ensure_ascii=False)
+        return dumps(loads(ret_text), option=OPT_INDENT_2).decode()
     except JSONDecodeError:
         return ret_text
 
@@ -293,15 +487,37 @@ def prompt_manual_fix(deferred: DeferredPost) -> dict | None:
     return corrected
 
 
+results_lock = Lock()
+
+
+@cache
+def get_results_db(path: Path) -> sqlite3.Connection:
+    conn = sqlite3.connect(
+        path / "results.sqlite", autocommit=True, check_same_thread=False
+    )
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS results (key TEXT PRIMARY KEY, data TEXT NOT NULL)"
+    )
+    return conn
+
+
+def load_saved_post_keys() -> set[PostKey]:
+    # 兼容旧版本逐个保存的 JSON 文件
+    processed = parse_processed_post_keys(db_path.glob("*.json"))
+    with results_lock:
+        rows = get_results_db(db_path).execute("SELECT key FROM results").fetchall()
+    processed.update(key for (key,) in rows)
+    return processed
+
+
 def save_post_output(post: PostData, output: dict) -> None:
-    with suppress(FileExistsError):
-        with open(
-            db_path / f"{get_post_key(post)}.json",
-            "x",
-            encoding="utf-8",
-        ) as f:
-            f.write(dumps(output, ensure_ascii=False, indent=2))
-            logger.info("已保存编号 %s 的结果。", post["num"])
+    with results_lock:
+        cursor = get_results_db(db_path).execute(
+            "INSERT OR IGNORE INTO results (key, data) VALUES (?, ?)",
+            (get_post_key(post), dumps(output).decode()),
+        )
+    if cursor.rowcount:
+        logger.info("已保存编号 %s 的结果。", post["num"])
 
 
 def process_post(
@@ -317,7 +533,11 @@ def process_post(
         ret_text: str = ""
         try:
             logger.debug("开始处理帖子: #%s %s", post["num"], post["title"])
-            ret_text = get_llm_response(setting["prompt_type"], CONTENT.format(**post))
+            ret_text = get_llm_response(
+                setting["prompt_type"],
+                CONTENT.format(**post),
+                accept=matches_schema(SCHEMA["type"]),
+            )
 
             logger.debug("LLM 原始输出: #%s %s", post["num"], ret_text)
             result: dict = cast(dict, loads(ret_text))
@@ -341,8 +561,65 @@ def process_post(
         if output is None:
             return None
 
+    record_post_output(post, output)
+
+
+def process_posts_with_batch_api(
+    posts: list[PostData],
+) -> tuple[list[DeferredPost], list[PostData]]:
+    """
+    离线模式：未命中缓存的帖子一次提交到 Batch API。
+    返回 (解析失败、待人工修正的帖子, 需要改为实时请求的帖子)。
+    """
+    accept = matches_schema(SCHEMA["type"])
+    llm_cache = get_llm_cache()
+    requests: dict[PostKey, tuple[str, str]] = {}
+    cache_keys: dict[PostKey, str] = {}
+    by_key: dict[PostKey, PostData] = {}
+    for post in posts:
+        key = get_post_key(post)
+        request = (setting["prompt_type"], CONTENT.format(**post))
+        cache_key = llm_cache_key(*request)
+        cached = llm_cache.get(cache_key)
+        if cached is not None and accept(cached):
+            logger.debug("LLM 缓存命中: #%s", post["num"])
+            record_post_output(post, loads(cached) | {"num": post["num"]})
+            continue
+        by_key[key] = post
+        requests[key] = request
+        cache_keys[key] = cache_key
+
+    if not requests:
+        return [], []
+    try:
+        batch_id = submit_batch_api_requests(requests)
+    except Exception as exc:
+        # 不支持 /v1/batches 的兼容服务端会在提交时报错
+        logger.error("提交 Batch API 任务失败，改为实时请求: %s", exc)
+        return [], list(by_key.values())
+    responses = wait_batch_api_responses(batch_id)
+
+    deferred_posts: list[DeferredPost] = []
+    live_posts: list[PostData] = []
+    for key, post in by_key.items():
+        if key not in responses:
+            logger.warning("编号 %s 未取得 Batch API 结果，改为实时请求。", post["num"])
+            live_posts.append(post)
+            continue
+        ret_text = responses[key]
+        logger.debug("LLM 原始输出: #%s %s", post["num"], ret_text)
+        if not accept(ret_text):
+            logger.warning("编号 %s 解析失败，已推迟到最后串行处理。", post["num"])
+            deferred_posts.append(DeferredPost(post=post, ret_text=ret_text))
+            continue
+        llm_cache[cache_keys[key]] = ret_text
+        record_post_output(post, loads(ret_text) | {"num": post["num"]})
+    return deferred_posts, live_posts
+
+
+def record_post_output(post: PostData, output: dict) -> None:
     save_post_output(post, output)
-    if output is not None and output["type"] != "invalid":
+    if output["type"] != "invalid":
         report = ValidReport(
             mcp=output["mcp"], reason=output["reason"], type=output["type"]
         )
@@ -351,6 +628,80 @@ def process_post(
         all_valid_reports[get_post_key(post)] = report
 
 
+def match_batch_results(
+    posts: list[PostData], ret_text: str
+) -> tuple[list[tuple[PostData, dict]], list[PostData]]:
+    """
+    按 num 字段把批量回复对应到帖子。
+    返回 (已对应且校验通过的结果, 需要逐个重试的帖子)；缺失、重复或校验失败的帖子都需要重试。
+    """
+    try:
+        results = loads(ret_text)
+    except JSONDecodeError:
+        results = None
+    # 模型仍按单帖格式只返回一个对象时，只有单帖批次能确定其归属
+    if isinstance(results, dict) and len(posts) == 1:
+        results = [{**results, "num": posts[0]["num"]}]
+    if not isinstance(results, list):
+        return [], list(posts)
+
+    by_num: dict[int, list[dict]] = {}
+    for result in results:
+        if isinstance(result, dict) and isinstance(result.get("num"), int):
+            by_num.setdefault(result["num"], []).append(result)
+    post_counts = Counter(post["num"] for post in posts)
+
+    matched: list[tuple[PostData, dict]] = []
+    retry: list[PostData] = []
+    for post in posts:
+        candidates = by_num.get(post["num"], [])
+        # 同一批里编号重复（如 issue 与 discussion 同号）时无法区分，也交给逐个处理
+        if post_counts[post["num"]] != 1 or len(candidates) != 1:
+            retry.append(post)
+            continue
+        result = {k: v for k, v in candidates[0].items() if k != "num"}
+        try:
+            validate(instance=result, schema=SCHEMA["type"])
+        except ValidationError:
+            retry.append(post)
+            continue
+        matched.append((post, result))
+    return matched, retry
+
+
+def process_batch(posts: list[PostData]) -> list[DeferredPost]:
+    """一次请求判断多个帖子；无法对应或校验失败的帖子回退为逐个处理。"""
+    if len(posts) == 1:
+        deferred = process_post(posts[0], prompt_on_failure=False)
+        return [] if deferred is None else [deferred]
+
+    nums = [post["num"] for post in posts]
+    logger.debug("开始批量处理帖子: %s", nums)
+    ret_text = get_llm_response(
+        setting["prompt_type"] + BATCH_INSTRUCTION,
+        "\n---\n".join(CONTENT.format(**post) for post in posts),
+        # 只有每个帖子都能对应上时才缓存，否则重跑时会再次请求
+        accept=lambda text: not match_batch_results(posts, text)[1],
+    )
+    logger.debug("LLM 批量原始输出: %s %s", nums, ret_text)
+
+    matched, retry = match_batch_results(posts, ret_text)
+    for post, result in matched:
+        record_post_output(post, result | {"num": post["num"]})
+    if retry:
+        logger.warning(
+            "批量输出中编号 %s 无法对应或校验失败，改为逐个处理。",
+            [post["num"] for post in retry],
+        )
+
+    deferred_posts: list[DeferredPost] = []
+    for post in retry:
+        deferred = process_post(post, prompt_on_failure=False)
+        if deferred is not None:
+            deferred_posts.append(deferred)
+    return deferred_posts
+
+
 def is_dry_run() -> bool:
     return setting.get("dry_run", False)
 
@@ -361,7 +712,7 @@ def label_issue(issue_id: int, issue_type: str) -> None:
         if not label:
             logger.info(f"Issue #{issue_id} 的 {issue_type} 标签已禁用，跳过。")
             return
-        issue = repo.get_issue(number=issue_id)
+        issue = get_repo().get_issue(number=issue_id)
         existing_labels = {getattr(item, "name", str(item)) for item in issue.labels}
         if label in existing_labels:
             logger.info(f"Issue #{issue_id} 已存在标签 {label}，跳过。")
@@ -437,7 +788,9 @@ def process_report(key: PostKey, report: ValidReport) -> None:
         )
         + f"\n\nMCP 获取的补充信息：\n{mcp_context}"
     )
-    ret_text = get_llm_response(judgement_input, "")
+    ret_text = get_llm_response(
+        judgement_input, "", accept=matches_schema(SCHEMA["judgement"])
+    )
 
     # 解析并验证输出
     try:
@@ -476,10 +829,12 @@ def run():
     worker_count = setting.get("workers", 4)
     logger.debug("帖子处理 worker_count=%s", worker_count)
 
-    if not db_path.exists():
-        db_path.mkdir(parents=True)
+    db_path.mkdir(parents=True, exist_ok=True)
+
+    batch_size = max(1, setting.get("batch_size", 1))
+    logger.debug("帖子处理 batch_size=%s", batch_size)
 
-    post_queue: Queue[PostData | None] = Queue()
+    post_queue: Queue[list[PostData] | None] = Queue()
     error_queue: list[BaseException] = []
     deferred_posts: list[DeferredPost] = []
 
@@ -489,9 +844,7 @@ def run():
             if item is None:
                 return
             try:
-                deferred = process_post(item, prompt_on_failure=False)
-                if deferred is not None:
-                    deferred_posts.append(deferred)
+                deferred_posts.extend(process_batch(item))
             except BaseException as exc:
                 logger.error("处理帖子失败: %s", exc)
                 error_queue.append(exc)
@@ -504,9 +857,14 @@ def run():
         worker.start()
 
     try:
-        processed_keys = parse_processed_post_keys(db_path.glob("*.json"))
-        for post in fetch_issues_and_discussions(processed_keys):
-            post_queue.put(post)
+        processed_keys = load_saved_post_keys()
+        posts: Iterable[PostData] = fetch_issues_and_discussions(processed_keys)
+        if setting.get("batch_api", False):
+            # 离线模式：先整体提交到 Batch API，未取得结果的帖子再交给 worker 实时处理
+            deferred, posts = process_posts_with_batch_api(list(posts))
+            deferred_posts.extend(deferred)
+        for batch in batched(posts, batch_size):
+            post_queue.put(list(batch))
     finally:
         for _ in workers:
             post_queue.put(None)
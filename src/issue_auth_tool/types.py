@@ -43,6 +43,8 @@ class SettingConfig(TypedDict):
     type: list[str]
     rate_per_minute: int
     workers: NotRequired[int]
+    batch_size: NotRequired[int]
+    batch_api: NotRequired[bool]
     dry_run: NotRequired[bool]
     prompt_type: str
     prompt_judgement: str
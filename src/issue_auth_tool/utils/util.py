@@ -1,15 +1,18 @@
+import asyncio
 import json
 import threading
 import time
 from bisect import bisect_right, insort
-from functools import wraps
+from functools import cache, wraps
 from pathlib import Path
-from types import SimpleNamespace
 from typing import Any, Callable, ParamSpec, TypeVar
 
+import fastjsonschema
+import orjson
 from jsonschema.exceptions import ValidationError
 from jsonschema.validators import validator_for
 from prompt_toolkit.application import Application
+from prompt_toolkit.document import Document
 from prompt_toolkit.formatted_text import FormattedText
 from prompt_toolkit.key_binding import KeyBindings
 from prompt_toolkit.layout import Layout
@@ -30,6 +33,7 @@ R = TypeVar("R")
 SRC = Path(__file__).parent.parent
 
 
+@cache
 def load_regex(uri: str):
     # regex://username.regex → username.regex
     key = uri.replace("regex://", "")
@@ -57,45 +61,119 @@ Validator value: {e.validator_value}
 Instance: {e.instance}"""
 
 
-def validate(instance: object, schema: Any):
+def _memoize_by_schema(build: Callable[[Any], R]) -> Callable[[Any], R]:
+    # id(schema) → (schema, 结果)；保留 schema 引用以免 id 被复用
+    memo: dict[int, tuple[Any, R]] = {}
+
+    @wraps(build)
+    def wrapper(schema: Any) -> R:
+        cached = memo.get(id(schema))
+        if cached is not None and cached[0] is schema:
+            return cached[1]
+        result = build(schema)
+        memo[id(schema)] = (schema, result)
+        return result
+
+    return wrapper
+
+
+@_memoize_by_schema
+def get_validator(schema: Any):
     validator_cls = validator_for(schema)
     validator_cls.check_schema(schema)
-    validator = validator_cls(schema=schema, registry=registry)
-    validator.validate(instance)
+    return validator_cls(schema=schema, registry=registry)
+
+
+@_memoize_by_schema
+def get_fast_validator(schema: Any) -> Callable[[object], object]:
+    return fastjsonschema.compile(schema, handlers={"regex": load_regex})
+
+
+def validate(instance: object, schema: Any):
+    try:
+        get_fast_validator(schema)(instance)
+        return
+    except fastjsonschema.JsonSchemaValueException:
+        pass
+    # 仅在失败时交给 jsonschema 重新校验，以抛出带完整路径信息的 ValidationError
+    get_validator(schema).validate(instance)
 
 
 SCHEMA: dict[str, dict] = {
     "judgement": json.loads((SRC / "schema" / "judgement.schema.json").read_text()),
     "type": json.loads((SRC / "schema" / "type.schema.json").read_text()),
 }
-
-
-def edit_json(json_data: str, validator: dict) -> None | dict:
-    """
-    打开一个可编辑的 JSON 文本框，初始内容为 json_data 的漂亮打印。
-    - 按 Ctrl-S 保存并退出：返回解析后的 dict（如果 JSON 有误，会打印错误并返回 None）。
-    - 按 Esc 或 Ctrl-Q 取消编辑并返回 None。
-    """
-    text_area = TextArea(
-        text=json_data,
-        lexer=PygmentsLexer(JsonLexer),
-        scrollbar=False,
-        line_numbers=True,
-        height=Dimension(weight=1),  # <-- 关键：可伸缩
-        wrap_lines=False,
-    )
-
-    kb = KeyBindings()
-
-    @kb.add("c-s")  # Ctrl-S 保存并退出，返回文本
-    def _(event):
-        event.app.exit(result=text_area.text)
-
-    def on_text_changed(buf):
+for _schema in SCHEMA.values():
+    get_validator(_schema)
+    get_fast_validator(_schema)
+
+
+class _JsonEditor:
+    """edit_json 的编辑界面；构建一次后重复使用，每次只替换文本和 schema。"""
+
+    # 输入停顿这么久之后才重新校验，避免每次按键（或粘贴）都解析一遍
+    VALIDATE_DELAY = 0.15
+
+    def __init__(self) -> None:
+        self.validator: Any = None
+        self._pending_validation: asyncio.TimerHandle | None = None
+        self.text_area = TextArea(
+            lexer=PygmentsLexer(JsonLexer),
+            scrollbar=False,
+            line_numbers=True,
+            height=Dimension(weight=1),  # <-- 关键：可伸缩
+            wrap_lines=False,
+        )
+        self.status_label = Label("")
+
+        kb = KeyBindings()
+
+        @kb.add("c-s")  # Ctrl-S 保存并退出，返回文本
+        def _(event):
+            event.app.exit(result=self.text_area.text)
+
+        @kb.add("escape")  # Esc 取消
+        @kb.add("c-q")  # Ctrl-Q 取消
+        def _(event):
+            event.app.exit(result=None)
+
+        self.text_area.buffer.on_text_changed += self.on_text_changed
+
+        label = Label("按 Ctrl-S 保存并退出\n按 Esc 或 Ctrl-Q 取消编辑")
+        root_container = HSplit([label, self.text_area, self.status_label], padding=0)
+        self.app: Application[str | None] = Application(
+            layout=Layout(root_container),
+            key_bindings=kb,
+            full_screen=False,
+            mouse_support=True,
+            erase_when_done=True,
+        )
+
+    def on_text_changed(self, buf) -> None:
+        loop = self.app.loop
+        if not self.app.is_running or loop is None:
+            self.update_status()
+            return
+        self._cancel_pending_validation()
+        self._pending_validation = loop.call_later(
+            self.VALIDATE_DELAY, self._validate_later
+        )
+
+    def _validate_later(self) -> None:
+        self._pending_validation = None
+        self.update_status()
+        self.app.invalidate()
+
+    def _cancel_pending_validation(self) -> None:
+        if self._pending_validation is not None:
+            self._pending_validation.cancel()
+            self._pending_validation = None
+
+    def update_status(self) -> None:
         try:
-            parsed = json.loads(buf.text)
-            validate(instance=parsed, schema=validator)
-            status_label.text = FormattedText(
+            parsed = orjson.loads(self.text_area.text)
+            validate(instance=parsed, schema=self.validator)
+            self.status_label.text = FormattedText(
                 [
                     ("fg:ansigreen", "状态："),
                     ("fg:ansiwhite", "JSON 语法正确"),
@@ -103,38 +181,42 @@ def edit_json(json_data: str, validator: dict) -> None | dict:
             )
         except Exception as ex:
             # 显示错误（红色），只显示简短信息以免太长
-            status_label.text = FormattedText(
+            self.status_label.text = FormattedText(
                 [
                     ("fg:ansired", "状态："),
                     ("fg:ansiwhite", f"JSON 错误: {repr(ex).replace(r'\\\\', '\\')}"),
                 ]
             )
 
-    text_area.buffer.on_text_changed += on_text_changed
-
-    @kb.add("escape")  # Esc 取消
-    @kb.add("c-q")  # Ctrl-Q 取消
-    def _(event):
-        event.app.exit(result=None)
-
-    label = Label("按 Ctrl-S 保存并退出\n按 Esc 或 Ctrl-Q 取消编辑")
-    status_label = Label("")
-    on_text_changed(SimpleNamespace(text=json_data))
-    root_container = HSplit([label, text_area, status_label], padding=0)
-    app = Application(
-        layout=Layout(root_container),
-        key_bindings=kb,
-        full_screen=False,
-        mouse_support=True,
-        erase_when_done=True,
-    )
-    edited: str | None = app.run()
+    def run(self, json_data: str, validator: dict) -> str | None:
+        self.validator = validator
+        # reset 同时清空上一次编辑的撤销历史
+        self.text_area.buffer.reset(Document(json_data))
+        self.update_status()
+        try:
+            return self.app.run()
+        finally:
+            self._cancel_pending_validation()
+
+
+@cache
+def _get_json_editor() -> _JsonEditor:
+    return _JsonEditor()
+
+
+def edit_json(json_data: str, validator: dict) -> None | dict:
+    """
+    打开一个可编辑的 JSON 文本框，初始内容为 json_data 的漂亮打印。
+    - 按 Ctrl-S 保存并退出：返回解析后的 dict（如果 JSON 有误，会打印错误并返回 None）。
+    - 按 Esc 或 Ctrl-Q 取消编辑并返回 None。
+    """
+    edited = _get_json_editor().run(json_data, validator)
 
     if edited is None:
         return None
 
     try:
-        parsed = json.loads(edited)
+        parsed = orjson.loads(edited)
         validate(instance=parsed, schema=validator)
         # console.print(Syntax(json.dumps(parsed, indent=2, ensure_ascii=False),'json',theme='monokai',))
         return parsed
@@ -173,12 +255,10 @@ def rate_limit(
         def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
             with lock:
                 now = time.monotonic()
-                while reservations and reservations[0] <= now - per_seconds:
-                    reservations.pop(0)
+                # 一次切片丢弃所有已滑出窗口的预约，避免逐个 pop(0)
+                del reservations[: bisect_right(reservations, now - per_seconds)]
 
-                active_left = bisect_right(reservations, now - per_seconds)
-                active_right = bisect_right(reservations, now)
-                active_now = active_right - active_left
+                active_now = bisect_right(reservations, now)
                 available_now = max(0, max_calls - active_now)
 
                 scheduled_at = now
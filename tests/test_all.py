@@ -6,6 +6,7 @@ from typing import Literal
 import pytest
 from jsonschema import ValidationError
 
+from issue_auth_tool.utils.util import SCHEMA, get_fast_validator, get_validator
 from issue_auth_tool.utils.util import validate as schema_validate
 
 # atexit.register(save_on_exit)
@@ -91,3 +92,47 @@ def test_json_schema_validation(test_name, schema, data, should_pass):
         # illegal 用例：应该验证失败
         with pytest.raises(ValidationError):
             schema_validate(instance=data, schema=schema)
+
+
+def test_validator_is_cached_per_schema():
+    """同一个 schema 对象只构建一次 validator"""
+    schema = load_json(SCHEMA_DIR / "type.schema.json")
+    validator = get_validator(schema)
+
+    assert get_validator(schema) is validator
+    assert get_validator(load_json(SCHEMA_DIR / "type.schema.json")) is not validator
+    assert get_validator(SCHEMA["type"]) is get_validator(SCHEMA["type"])
+
+
+def test_regex_ref_files_are_read_once(monkeypatch):
+    """regex:// 引用的文件只读取一次"""
+    import builtins
+
+    from issue_auth_tool.utils.util import load_regex
+
+    load_regex.cache_clear()
+    opened: list[str] = []
+    real_open = builtins.open
+
+    def counting_open(file, *args, **kwargs):
+        opened.append(str(file))
+        return real_open(file, *args, **kwargs)
+
+    monkeypatch.setattr(builtins, "open", counting_open)
+    for _ in range(3):
+        with pytest.raises(ValidationError):
+            schema_validate(
+                instance={"type": "alias", "reason": "r", "mcp": ["bad"]},
+                schema=SCHEMA["type"],
+            )
+
+    assert [path for path in opened if path.endswith(".regex")] == [
+        str(SCHEMA_DIR / "regex" / "type.regex")
+    ]
+
+
+def test_fast_validator_is_cached_per_schema():
+    """fastjsonschema 编译结果同样按 schema 缓存"""
+    schema = load_json(SCHEMA_DIR / "judgement.schema.json")
+
+    assert get_fast_validator(schema) is get_fast_validator(schema)
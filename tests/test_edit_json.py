@@ -0,0 +1,85 @@
+import threading
+import time
+
+from prompt_toolkit.application import create_app_session
+from prompt_toolkit.input import create_pipe_input
+from prompt_toolkit.output import DummyOutput
+
+import issue_auth_tool.utils.util as utils
+
+
+def test_edit_json_reuses_editor_between_calls():
+    utils._get_json_editor.cache_clear()
+    try:
+        with create_pipe_input() as pipe_input:
+            with create_app_session(input=pipe_input, output=DummyOutput()):
+                pipe_input.send_text("\x13")  # Ctrl-S
+                first = utils.edit_json('{"type": "invalid"}', {"type": "object"})
+                editor = utils._get_json_editor()
+
+                pipe_input.send_text("\x13")
+                second = utils.edit_json('["del 1"]', utils.SCHEMA["judgement"])
+
+                assert utils._get_json_editor() is editor
+                assert editor.validator is utils.SCHEMA["judgement"]
+    finally:
+        utils._get_json_editor.cache_clear()
+
+    assert first == {"type": "invalid"}
+    assert second == ["del 1"]
+
+
+def test_edit_json_debounces_validation_while_typing(monkeypatch):
+    utils._get_json_editor.cache_clear()
+    status_updates: list[str] = []
+    update_status = utils._JsonEditor.update_status
+
+    def counting_update_status(self):
+        status_updates.append(self.text_area.text)
+        update_status(self)
+
+    monkeypatch.setattr(utils._JsonEditor, "update_status", counting_update_status)
+    try:
+        with create_pipe_input() as pipe_input:
+            with create_app_session(input=pipe_input, output=DummyOutput()):
+                # 三次按键后立即保存：只有打开编辑器时的那一次校验
+                pipe_input.send_text("   \x13")
+                result = utils.edit_json('["del 1"]', utils.SCHEMA["judgement"])
+    finally:
+        utils._get_json_editor.cache_clear()
+
+    assert result == ["del 1"]
+    assert status_updates == ['["del 1"]']
+
+
+def test_edit_json_validates_after_typing_pauses(monkeypatch):
+    utils._get_json_editor.cache_clear()
+    status_updates: list[tuple[str, str]] = []
+    update_status = utils._JsonEditor.update_status
+
+    def recording_update_status(self):
+        update_status(self)
+        label = "".join(text for _, text, *_ in self.status_label.text)
+        status_updates.append((self.text_area.text, label))
+
+    def type_then_save(pipe_input):
+        pipe_input.send_text(",")
+        # 停顿超过防抖间隔，让延迟校验真正执行
+        time.sleep(utils._JsonEditor.VALIDATE_DELAY * 3)
+        pipe_input.send_text("\x13")
+
+    monkeypatch.setattr(utils._JsonEditor, "update_status", recording_update_status)
+    try:
+        with create_pipe_input() as pipe_input:
+            with create_app_session(input=pipe_input, output=DummyOutput()):
+                typist = threading.Thread(target=type_then_save, args=(pipe_input,))
+                typist.start()
+                result = utils.edit_json('["del 1"]', utils.SCHEMA["judgement"])
+                typist.join()
+    finally:
+        utils._get_json_editor.cache_clear()
+
+    assert result is None
+    assert [text for text, _ in status_updates] == ['["del 1"]', '["del 1"],']
+    assert "JSON 语法正确" in status_updates[0][1]
+    assert "JSON 错误" in status_updates[1][1]
@@ -65,7 +65,7 @@ def _make_llm_type_response(
         ("invalid", [], False),
     ],
 )
-def test_first_type_detection(llm_type, mcp, expect_in_reports):
+def test_first_type_detection(llm_type, mcp, expect_in_reports, tmp_path):
     """
     Phase 1: First LLM call identifies issue type and generates MCP instructions.
 
@@ -90,7 +90,7 @@ def test_first_type_detection(llm_type, mcp, expect_in_reports):
         ),
         patch(
             "issue_auth_tool.issues_auth_tool.db_path",
-            MagicMock(),
+            tmp_path,
         ),
     ):
         process_post(TEST_POST, prompt_on_failure=True)
@@ -150,6 +150,516 @@ def test_processed_post_keys_support_new_and_legacy_database_names():
     assert keys == {"issues-1", "discussions-2", "issues-42", "discussions-42"}
 
 
+def test_long_discussion_body_is_truncated():
+    """
+    Phase 1: Discussion bodies are cut to DISCUSSION_TEXT_LIMIT characters
+    after markdown is stripped, and strip_markdown never sees more than twice
+    that many characters.
+    """
+    from types import SimpleNamespace
+
+    from issue_auth_tool import issues_auth_tool
+
+    limit = issues_auth_tool.DISCUSSION_TEXT_LIMIT
+    fake_repo = MagicMock()
+    fake_repo.get_discussions.return_value = [
+        SimpleNamespace(number=7, title="Long", body="**粗**" + "字" * limit * 10)
+    ]
+    strip_markdown = issues_auth_tool.strip_markdown
+    stripped_lengths: list[int] = []
+
+    def measuring_strip_markdown(text: str) -> str:
+        stripped_lengths.append(len(text))
+        return strip_markdown(text)
+
+    with (
+        patch.object(issues_auth_tool, "get_repo", return_value=fake_repo),
+        patch.object(issues_auth_tool, "strip_markdown", measuring_strip_markdown),
+        patch.object(
+            issues_auth_tool,
+            "setting",
+            {**issues_auth_tool.setting, "type": ["discussions"]},
+        ),
+    ):
+        posts = list(issues_auth_tool.fetch_issues_and_discussions())
+
+    assert [post["num"] for post in posts] == [7]
+    assert posts[0]["text"] == ("粗" + "字" * limit)[:limit]
+    assert stripped_lengths == [limit * 2]
+
+
+def test_saved_results_are_skipped_on_next_run(tmp_path):
+    """
+    Phase 1: Results are stored once in the SQLite database and, together
+    with legacy JSON files, mark posts as already processed.
+    """
+    from issue_auth_tool.issues_auth_tool import (
+        get_results_db,
+        load_saved_post_keys,
+        save_post_output,
+    )
+
+    (tmp_path / "7.json").write_text("{}", encoding="utf-8")
+    post = PostData(title="A", num=1, text="a", source="issues")
+
+    with patch("issue_auth_tool.issues_auth_tool.db_path", tmp_path):
+        save_post_output(post, {"type": "invalid", "reason": "r", "mcp": [], "num": 1})
+        save_post_output(post, {"type": "evil", "reason": "r", "mcp": [], "num": 1})
+        keys = load_saved_post_keys()
+
+    rows = get_results_db(tmp_path).execute("SELECT key, data FROM results").fetchall()
+    assert [(key, json.loads(data)["type"]) for key, data in rows] == [
+        ("issues-1", "invalid")
+    ]
+    assert keys == {"issues-1", "issues-7", "discussions-7"}
+
+
+@pytest.mark.parametrize(
+    "markdown,expected",
+    [
+        ("# 标题\n\n正文", "标题\n正文"),
+        ("见 [链接文字](https://example.com)", "见 链接文字"),
+        ("**加粗** 与 *斜体*", "加粗 与 斜体"),
+        ("前\n```\ncode\n```\n后", "前\n后"),
+        ("![图](a.png)\n> 引用\n---\n结尾", "引用\n结尾"),
+    ],
+)
+def test_strip_markdown(markdown, expected):
+    """
+    Phase 1: Post bodies are reduced to plain text before being sent to the LLM.
+    """
+    from issue_auth_tool.issues_auth_tool import strip_markdown
+
+    assert strip_markdown(markdown) == expected
+
+
+def test_batch_detection_records_each_post():
+    """
+    Phase 1: A batched LLM reply is matched back onto posts by num, regardless
+    of order; invalid entries fall back to a per-post request.
+    """
+    from issue_auth_tool.issues_auth_tool import all_valid_reports, process_batch
+
+    all_valid_reports.clear()
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+        PostData(title="C", num=3, text="c", source="issues"),
+    ]
+    batch_output = json.dumps(
+        [
+            {"num": 2, "type": "invalid", "reason": "suggestion", "mcp": []},
+            {"num": 1, "type": "evil", "reason": "bad", "mcp": ["view 1"]},
+            {"num": 3, "type": "evil", "reason": "missing mcp", "mcp": []},
+        ]
+    )
+    retry_output = _make_llm_type_response("alias", "retried", ["view 3"])
+
+    with (
+        patch(
+            "issue_auth_tool.issues_auth_tool.get_llm_response",
+            side_effect=[batch_output, retry_output],
+        ) as mock_llm,
+        patch("issue_auth_tool.issues_auth_tool.save_post_output") as mock_save,
+    ):
+        deferred = process_batch(posts)
+
+    assert deferred == []
+    assert mock_llm.call_count == 2
+    assert [call.args[1]["num"] for call in mock_save.call_args_list] == [1, 2, 3]
+    assert mock_save.call_args_list[0].args[1] == {
+        "type": "evil",
+        "reason": "bad",
+        "mcp": ["view 1"],
+        "num": 1,
+    }
+    assert set(all_valid_reports) == {"issues-1", "issues-3"}
+    assert all_valid_reports["issues-1"]["type"] == "evil"
+    assert all_valid_reports["issues-3"]["type"] == "alias"
+
+
+def test_batch_detection_retries_missing_and_duplicate_entries():
+    """
+    Phase 1: Posts whose num is missing from, or repeated in, the batched reply
+    are retried post by post instead of being guessed.
+    """
+    from issue_auth_tool.issues_auth_tool import match_batch_results
+
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+        PostData(title="C", num=3, text="c", source="issues"),
+        PostData(title="D", num=4, text="d", source="issues"),
+        PostData(title="D", num=4, text="d", source="discussions"),
+    ]
+    entry = {"type": "invalid", "reason": "r", "mcp": []}
+    ret_text = json.dumps(
+        [
+            entry | {"num": 1},
+            entry | {"num": 1},
+            entry | {"num": 2},
+            entry | {"num": 4},
+            entry | {"num": 99},
+        ]
+    )
+
+    matched, retry = match_batch_results(posts, ret_text)
+
+    assert [(post["num"], result) for post, result in matched] == [(2, entry)]
+    assert [(post["num"], post["source"]) for post in retry] == [
+        (1, "issues"),
+        (3, "issues"),
+        (4, "issues"),
+        (4, "discussions"),
+    ]
+
+
+def test_batch_detection_falls_back_when_reply_does_not_match():
+    """
+    Phase 1: A batched reply that is not a JSON array is retried post by post.
+    The batch prompt explicitly overrides the single-object output rule.
+    """
+    from issue_auth_tool.issues_auth_tool import (
+        BATCH_INSTRUCTION,
+        all_valid_reports,
+        process_batch,
+        setting,
+    )
+
+    all_valid_reports.clear()
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+    ]
+    single_output = _make_llm_type_response("invalid")
+
+    with (
+        patch(
+            "issue_auth_tool.issues_auth_tool.get_llm_response",
+            side_effect=[single_output, single_output, single_output],
+        ) as mock_llm,
+        patch("issue_auth_tool.issues_auth_tool.save_post_output") as mock_save,
+    ):
+        deferred = process_batch(posts)
+
+    assert deferred == []
+    assert mock_llm.call_count == 3
+    assert mock_save.call_count == 2
+    batch_instructions = mock_llm.call_args_list[0].args[0]
+    assert batch_instructions == setting["prompt_type"] + BATCH_INSTRUCTION
+    assert "忽略上文" in BATCH_INSTRUCTION and "JSON 数组" in BATCH_INSTRUCTION
+
+
+def test_single_object_reply_matches_single_post_batch():
+    """
+    Phase 1: A bare object without num is accepted for a one-post batch, but
+    cannot be attributed (and is retried) when the batch has several posts.
+    """
+    from issue_auth_tool.issues_auth_tool import match_batch_results
+
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+    ]
+    single_output = _make_llm_type_response("evil")
+
+    matched, retry = match_batch_results(posts[:1], single_output)
+    assert retry == []
+    assert matched == [(posts[0], json.loads(single_output))]
+
+    matched, retry = match_batch_results(posts, single_output)
+    assert matched == []
+    assert retry == posts
+
+
+def _batch_output_line(custom_id: str, content: str) -> str:
+    body = {"choices": [{"message": {"content": content}}]}
+    return json.dumps(
+        {"custom_id": custom_id, "response": {"status_code": 200, "body": body}}
+    )
+
+
+def _fake_batch_client(retrieve: list, output: str = "") -> MagicMock:
+    """Fake client whose batches.retrieve yields each (status, output_file_id) or raises."""
+    from types import SimpleNamespace
+
+    fake_client = MagicMock()
+    fake_client.batches.create.return_value = SimpleNamespace(id="batch_1")
+    fake_client.batches.retrieve.side_effect = [
+        item
+        if isinstance(item, Exception)
+        else SimpleNamespace(id="batch_1", status=item[0], output_file_id=item[1])
+        for item in retrieve
+    ]
+    fake_client.files.content.return_value = SimpleNamespace(text=output)
+    return fake_client
+
+
+def test_batch_api_results_are_routed_by_custom_id():
+    """
+    Phase 1: Batch API replies are matched back to posts by custom_id.
+    Cached posts are not submitted, valid replies are cached, unparsable
+    replies are deferred and missing ones are handed back for live calls.
+    """
+    from issue_auth_tool import issues_auth_tool
+
+    all_valid_reports = issues_auth_tool.all_valid_reports
+    all_valid_reports.clear()
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+        PostData(title="C", num=3, text="c", source="issues"),
+        PostData(title="D", num=4, text="d", source="issues"),
+    ]
+    prompt = issues_auth_tool.setting["prompt_type"]
+    cache_key = issues_auth_tool.llm_cache_key
+    cached_reply = _make_llm_type_response("invalid")
+    llm_cache = {
+        cache_key(prompt, issues_auth_tool.CONTENT.format(**posts[3])): cached_reply
+    }
+
+    evil_reply = _make_llm_type_response("evil")
+    fake_client = _fake_batch_client(
+        [("in_progress", None), ("completed", "file_out")],
+        "\n".join(
+            [
+                _batch_output_line("issues-1", evil_reply),
+                _batch_output_line("issues-2", "not json"),
+            ]
+        ),
+    )
+
+    with (
+        patch.object(issues_auth_tool, "get_client", return_value=fake_client),
+        patch.object(issues_auth_tool, "get_llm_cache", return_value=llm_cache),
+        patch.object(issues_auth_tool.time, "sleep"),
+        patch("issue_auth_tool.issues_auth_tool.get_llm_response") as mock_llm,
+        patch("issue_auth_tool.issues_auth_tool.save_post_output") as mock_save,
+    ):
+        deferred, live_posts = issues_auth_tool.process_posts_with_batch_api(posts)
+
+    submitted = fake_client.files.create.call_args.kwargs["file"][1].splitlines()
+    assert [json.loads(line)["custom_id"] for line in submitted] == [
+        "issues-1",
+        "issues-2",
+        "issues-3",
+    ]
+    assert [item.post["num"] for item in deferred] == [2]
+    assert [post["num"] for post in live_posts] == [3]
+    mock_llm.assert_not_called()
+    assert [call.args[0]["num"] for call in mock_save.call_args_list] == [4, 1]
+    assert set(all_valid_reports) == {"issues-1"}
+    assert llm_cache[
+        cache_key(prompt, issues_auth_tool.CONTENT.format(**posts[0]))
+    ] == (evil_reply)
+    assert len(llm_cache) == 2
+    fake_client.batches.cancel.assert_not_called()
+
+
+def _run_batch_api(fake_client: MagicMock, posts: list[PostData]):
+    from issue_auth_tool import issues_auth_tool
+
+    with (
+        patch.object(issues_auth_tool, "get_client", return_value=fake_client),
+        patch.object(issues_auth_tool, "get_llm_cache", return_value={}),
+        patch.object(issues_auth_tool.time, "sleep"),
+        patch("issue_auth_tool.issues_auth_tool.save_post_output") as mock_save,
+    ):
+        deferred, live_posts = issues_auth_tool.process_posts_with_batch_api(posts)
+    return (
+        deferred,
+        live_posts,
+        [call.args[0]["num"] for call in mock_save.call_args_list],
+    )
+
+
+def test_batch_api_poll_errors_are_retried():
+    """
+    Phase 1: A transient error while polling an accepted batch is retried;
+    the batch is neither cancelled nor replaced by live requests.
+    """
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+    ]
+    fake_client = _fake_batch_client(
+        [ConnectionError("reset by peer"), ("completed", "file_out")],
+        "\n".join(
+            _batch_output_line(
+                f"issues-{post['num']}", _make_llm_type_response("invalid")
+            )
+            for post in posts
+        ),
+    )
+
+    deferred, live_posts, saved = _run_batch_api(fake_client, posts)
+
+    assert (deferred, live_posts, saved) == ([], [], [1, 2])
+    assert fake_client.batches.retrieve.call_count == 2
+    fake_client.files.create.assert_called_once()
+    fake_client.batches.cancel.assert_not_called()
+
+
+def test_batch_api_partial_results_of_expired_batch_are_kept():
+    """
+    Phase 1: An expired batch still yields the replies it finished; only the
+    posts without a reply go to live requests.
+    """
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+    ]
+    fake_client = _fake_batch_client(
+        [("expired", "file_out")],
+        _batch_output_line("issues-1", _make_llm_type_response("invalid")),
+    )
+
+    deferred, live_posts, saved = _run_batch_api(fake_client, posts)
+
+    assert deferred == []
+    assert [post["num"] for post in live_posts] == [2]
+    assert saved == [1]
+    fake_client.files.content.assert_called_once_with("file_out")
+
+
+def test_batch_api_is_cancelled_before_giving_up():
+    """
+    Phase 1: When polling keeps failing, the submitted batch is cancelled
+    before its posts fall back to live requests, so nothing is billed twice.
+    """
+    from issue_auth_tool import issues_auth_tool
+
+    posts = [PostData(title="A", num=1, text="a", source="issues")]
+    retries = issues_auth_tool.BATCH_API_MAX_RETRIES
+    fake_client = _fake_batch_client([TimeoutError("poll")] * retries)
+
+    deferred, live_posts, saved = _run_batch_api(fake_client, posts)
+
+    assert (deferred, live_posts, saved) == ([], posts, [])
+    assert fake_client.batches.retrieve.call_count == retries
+    fake_client.batches.cancel.assert_called_once_with("batch_1")
+
+
+def test_batch_api_submit_failure_falls_back_to_workers(tmp_path):
+    """
+    Phase 1: When the endpoint rejects the Batch API submission, run() hands
+    every post to the normal worker queue instead of failing.
+    """
+    from issue_auth_tool import issues_auth_tool
+
+    posts = [
+        PostData(title="A", num=1, text="a", source="issues"),
+        PostData(title="B", num=2, text="b", source="issues"),
+    ]
+    fake_client = MagicMock()
+    fake_client.files.create.side_effect = RuntimeError("404 /v1/files")
+    processed: list[int] = []
+
+    with (
+        patch.object(issues_auth_tool, "get_client", return_value=fake_client),
+        patch.object(issues_auth_tool, "get_llm_cache", return_value={}),
+        patch.object(issues_auth_tool, "db_path", tmp_path),
+        patch.object(
+            issues_auth_tool,
+            "setting",
+            {**issues_auth_tool.setting, "batch_api": True, "workers": 2},
+        ),
+        patch.object(
+            issues_auth_tool, "fetch_issues_and_discussions", return_value=iter(posts)
+        ),
+        patch.object(
+            issues_auth_tool,
+            "process_batch",
+            side_effect=lambda batch: processed.extend(p["num"] for p in batch) or [],
+        ),
+    ):
+        issues_auth_tool.run()
+
+    assert sorted(processed) == [1, 2]
+
+
+def test_llm_response_is_streamed_and_joined():
+    """
+    Phase 1: The LLM reply is requested as a stream and its deltas concatenated.
+    """
+    from types import SimpleNamespace
+
+    from issue_auth_tool import issues_auth_tool
+
+    def chunk(content: str | None, with_choice: bool = True) -> SimpleNamespace:
+        choices = [SimpleNamespace(delta=SimpleNamespace(content=content))]
+        return SimpleNamespace(choices=choices if with_choice else [])
+
+    fake_client = MagicMock()
+    fake_client.chat.completions.create.return_value = iter(
+        [chunk('{"type":'), chunk(None), chunk('"invalid"}'), chunk(None, False)]
+    )
+
+    with patch.object(issues_auth_tool, "get_client", return_value=fake_client):
+        ret = issues_auth_tool.request_llm_response("system", "user")
+
+    assert ret == '{"type":"invalid"}'
+    assert fake_client.chat.completions.create.call_args.kwargs["stream"] is True
+
+
+def test_llm_response_cache_only_keeps_accepted_replies():
+    """
+    Phase 1: Identical prompts are answered from the response cache, but
+    replies that fail the schema are requested again.
+    """
+    from issue_auth_tool import issues_auth_tool
+    from issue_auth_tool.utils.util import SCHEMA
+
+    accept = issues_auth_tool.matches_schema(SCHEMA["judgement"])
+    llm_cache: dict[str, str] = {}
+    with (
+        patch.object(issues_auth_tool, "get_llm_cache", return_value=llm_cache),
+        patch(
+            "issue_auth_tool.issues_auth_tool.request_llm_response",
+            side_effect=["not json", '["bogus"]', '["del 1"]', "unused"],
+        ) as mock_request,
+    ):
+        get = issues_auth_tool.get_llm_response
+        assert get("system", "user", accept=accept) == "not json"
+        assert get("system", "user", accept=accept) == '["bogus"]'
+        assert get("system", "user", accept=accept) == '["del 1"]'
+        assert get("system", "user", accept=accept) == '["del 1"]'
+
+    assert mock_request.call_count == 3
+    assert list(llm_cache.values()) == ['["del 1"]']
+
+
+def test_schema_invalid_reply_is_requested_again():
+    """
+    Phase 1: A post whose reply failed validation gets a fresh LLM call on the
+    next attempt instead of the same reply from the cache.
+    """
+    from issue_auth_tool import issues_auth_tool
+
+    bogus = json.dumps({"type": "bogus", "reason": "r", "mcp": []})
+    valid = _make_llm_type_response("invalid")
+    llm_cache: dict[str, str] = {}
+
+    with (
+        patch.object(issues_auth_tool, "get_llm_cache", return_value=llm_cache),
+        patch(
+            "issue_auth_tool.issues_auth_tool.request_llm_response",
+            side_effect=[bogus, valid],
+        ) as mock_request,
+        patch("issue_auth_tool.issues_auth_tool.save_post_output") as mock_save,
+    ):
+        deferred = issues_auth_tool.process_post(TEST_POST, prompt_on_failure=False)
+        assert deferred is not None
+        assert deferred.ret_text == bogus
+        assert llm_cache == {}
+
+        assert issues_auth_tool.process_post(TEST_POST, prompt_on_failure=False) is None
+
+    assert mock_request.call_count == 2
+    mock_save.assert_called_once()
+    assert list(llm_cache.values()) == [valid]
+
+
 def test_first_type_detection_invalid_json_deferred():
     """
     Phase 1: When LLM returns invalid JSON, process_post should return a DeferredPost.
@@ -376,7 +886,7 @@ def test_label_failure_does_not_stop_final_commands():
     executed_commands: list[str] = []
 
     with (
-        patch.object(issues_auth_tool, "repo", fake_repo),
+        patch.object(issues_auth_tool, "get_repo", return_value=fake_repo),
         patch(
             "issue_auth_tool.issues_auth_tool.get_llm_response",
             return_value='["del 1"]',
@@ -444,7 +954,7 @@ def test_label_issue_uses_configured_label_key():
     fake_repo.get_issue.return_value = issue
 
     with (
-        patch.object(issues_auth_tool, "repo", fake_repo),
+        patch.object(issues_auth_tool, "get_repo", return_value=fake_repo),
         patch.object(
             issues_auth_tool,
             "setting",
@@ -512,7 +1022,7 @@ def test_dry_run_skips_final_command_mutations():
     mock_alias.assert_not_called()
 
 
-def test_generate_called_at_end_of_run():
+def test_generate_called_at_end_of_run(tmp_path):
     """
     Phase 3: helper.do_generate() is called at the end of run()
     when there are valid reports.
@@ -535,9 +1045,6 @@ def test_generate_called_at_end_of_run():
         source="issues",
     )
 
-    fake_db_path = MagicMock()
-    fake_db_path.exists.return_value = True
-
     with (
         patch(
             "issue_auth_tool.issues_auth_tool.fetch_issues_and_discussions",
@@ -557,7 +1064,7 @@ def test_generate_called_at_end_of_run():
         patch.object(viewer_helper, "do_generate") as mock_generate,
         patch(
             "issue_auth_tool.issues_auth_tool.db_path",
-            fake_db_path,
+            tmp_path,
         ),
         patch(
             "issue_auth_tool.issues_auth_tool.setting",